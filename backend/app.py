@@ -1,12 +1,28 @@
-from fastapi import FastAPI, File, UploadFile
+import time
+_import_start = time.perf_counter()
+
+from fastapi import FastAPI, File, Header, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-import tensorflow as tf
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from typing import List, Optional
 import numpy as np
 from PIL import Image
+import asyncio
 import io
+import json
+import threading
 import uvicorn
 import os
 import glob
+import importlib
+
+from cascade import TFLiteClassifier, CascadeStats, load_thresholds, is_confident
+from tiling import make_tiles, aggregate
+from jobs import JobStore, JobWorkerPool, read_uploads, summarize
+from history import HistoryStore, PERIOD_FORMATS
+from onnx_backend import OnnxModel
+from serving_config import load_serving_config, pin_worker
 
 app = FastAPI()
 
@@ -17,10 +33,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# "tensorflow" serves the .keras model; "onnx" serves the exported .onnx model
+# through ONNX Runtime and never imports TensorFlow (unless the cascade needs tf.lite)
+INFERENCE_BACKEND = "tensorflow"
+ONNX_MODEL_PATH = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango_disease_model.onnx"
+# 0 lets ONNX Runtime use one thread per physical core
+ONNX_INTRA_OP_THREADS = 0
+
+# Written by tune_serving.py; sets workers, threads per worker, CPU pinning and job batch size
+SERVING_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serving_config.json")
+serving_config = load_serving_config(SERVING_CONFIG_PATH, INFERENCE_BACKEND)
+if serving_config["intra_op_threads"]:
+    ONNX_INTRA_OP_THREADS = serving_config["intra_op_threads"]
+
+# TensorFlow is imported by the startup thread, not at module import
+tf = None
 model = None
+inference_fns = {}
 class_names = ['Anthracnose', 'Bacterial Canker', 'Cutting Weevil', 'Die Back', 
                'Gall Midge', 'Healthy', 'Powdery Mildew', 'Sooty Mould']
 
+IMG_SIZE = (224, 224)
+# Batch sizes with a pre-traced inference function; requests are padded up to the nearest one
+BATCH_BUCKETS = (1, 4, 8, 16, 32)
+
+# Bulk diagnosis jobs
+JOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs_data")
+JOB_BATCH_SIZE = serving_config["batch_size"] or BATCH_BUCKETS[-1]
+JOB_WORKERS = 2
+
+# Server-side diagnosis history, written off the request path
+HISTORY_ENABLED = False
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history_data")
+
+# Confidence cascade: a fast TFLite model answers first, the full model only when it is unsure
+CASCADE_ENABLED = False
+FAST_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "models", "mango_disease_model.tflite")
+CASCADE_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cascade_config.json")
+
+fast_model = None
+cascade_thresholds = None
+cascade_stats = CascadeStats()
+
+# Cold start: bind the port first and load the model in a background thread
+BACKGROUND_STARTUP = True
+# How long a request that arrives during startup waits for the model before giving up
+READY_TIMEOUT = 60
+
+startup_phase = "starting"
+startup_timings = {}
+ready_event = None
+
 def find_model_file():
     """Find model file in both .keras and .h5 formats"""
     # ilisa ang directory below
@@ -47,6 +110,9 @@ def find_model_file():
 def load_model():
     """Load the trained model in either .keras or .h5 format"""
     global model
+    if INFERENCE_BACKEND == "onnx":
+        return load_onnx_model()
+    
     try:
         model_path = find_model_file()
         if not model_path:
@@ -67,64 +133,427 @@ def load_model():
         print("Try converting .h5 to .keras format if having issues")
         return False
 
-if load_model():
-    print("API Ready! Model is loaded and ready for predictions.")
-else:
-    print("API started but model failed to load")
+def load_onnx_model():
+    """Load the exported .onnx model into an optimised ONNX Runtime session"""
+    global model
+    try:
+        if not os.path.exists(ONNX_MODEL_PATH):
+            print(f"No ONNX model found at: {ONNX_MODEL_PATH}")
+            print("Run training_scripts/export_onnx.py first")
+            return False
+        
+        print(f"Loading ONNX model from: {ONNX_MODEL_PATH}")
+        model = OnnxModel(ONNX_MODEL_PATH, ONNX_INTRA_OP_THREADS)
+        
+        print("Mango Disease Model Loaded Successfully! (ONNX Runtime)")
+        print(f"Model input shape: {model.input_shape}")
+        print(f"Model output shape: {model.output_shape}")
+        return True
+        
+    except Exception as e:
+        print(f"ONNX model loading failed: {e}")
+        return False
 
-@app.post("/predict")
-async def predict(file: UploadFile = File(...)):
-    if model is None:
+def build_inference_fns():
+    """Trace and warm up one fixed-shape inference function per batch bucket"""
+    global inference_fns
+    
+    inference_fns = {}
+    if INFERENCE_BACKEND == "onnx":
+        for bucket in BATCH_BUCKETS:
+            inference_fns[bucket] = model.predict
+            model.predict(np.zeros((bucket, *IMG_SIZE, 3), dtype=np.float32))
+        print(f"Warmed up ONNX inference for batch sizes: {list(BATCH_BUCKETS)}")
+        return
+    
+    @tf.function
+    def infer(images):
+        return model(images, training=False)
+    
+    for bucket in BATCH_BUCKETS:
+        spec = tf.TensorSpec([bucket, *IMG_SIZE, 3], tf.float32)
+        concrete = infer.get_concrete_function(spec)
+        inference_fns[bucket] = lambda images, fn=concrete: fn(tf.constant(images)).numpy()
+        inference_fns[bucket](np.zeros(spec.shape, dtype=np.float32))
+    print(f"Warmed up inference for batch sizes: {list(BATCH_BUCKETS)}")
+
+def run_inference(img_array):
+    """Predict a (N, H, W, 3) array, padding each chunk up to the nearest warmed bucket"""
+    outputs = []
+    max_bucket = BATCH_BUCKETS[-1]
+    for start in range(0, len(img_array), max_bucket):
+        chunk = img_array[start:start + max_bucket]
+        bucket = next(b for b in BATCH_BUCKETS if b >= len(chunk))
+        padded = np.zeros((bucket, *IMG_SIZE, 3), dtype=np.float32)
+        padded[:len(chunk)] = chunk
+        outputs.append(inference_fns[bucket](padded)[:len(chunk)])
+    return np.concatenate(outputs)
+
+def load_fast_model():
+    """Load the fast TFLite model and the calibrated escalation thresholds"""
+    global fast_model, cascade_thresholds
+    try:
+        fast_model = TFLiteClassifier(FAST_MODEL_PATH)
+        cascade_thresholds = load_thresholds(CASCADE_CONFIG_PATH)
+        print(f"Cascade enabled: fast model {FAST_MODEL_PATH} ({fast_model.img_size[0]}x{fast_model.img_size[1]})")
+        print(f"Escalation thresholds: {cascade_thresholds}")
+        return True
+    except Exception as e:
+        print(f"Fast model loading failed, cascade disabled: {e}")
+        fast_model = None
+        return False
+
+def to_array(image, size=IMG_SIZE):
+    """Resize a decoded RGB image into a normalized array"""
+    return np.array(image.resize(size), dtype=np.float32) / 255.0
+
+def preprocess_image(contents):
+    """Decode uploaded bytes into a normalized 224x224 RGB array"""
+    image = Image.open(io.BytesIO(contents)).convert('RGB')
+    return to_array(image)
+
+def cascade_predict(image):
+    """Try the fast model first and escalate to the full model when it is unsure"""
+    start = time.perf_counter()
+    probs = fast_model.predict(to_array(image, fast_model.img_size))
+    fast_ms = (time.perf_counter() - start) * 1000
+    
+    if is_confident(probs, cascade_thresholds):
+        cascade_stats.record(fast_ms)
+        return probs, "fast"
+    
+    start = time.perf_counter()
+    probs = run_inference(np.expand_dims(to_array(image), axis=0))[0]
+    cascade_stats.record(fast_ms, (time.perf_counter() - start) * 1000)
+    return probs, "full"
+
+def predict_batch(images):
+    """Run a list of preprocessed images through the model in one forward pass"""
+    return run_inference(np.stack(images))
+
+def run_startup(loop):
+    """Import the inference runtime, load and warm up the model, then mark the server ready"""
+    global tf, startup_phase
+    started = time.perf_counter()
+    try:
+        startup_phase = "importing"
+        if INFERENCE_BACKEND == "onnx":
+            # Imported here only so the import cost shows up in the startup report
+            importlib.import_module("onnxruntime")
+        else:
+            import tensorflow
+            tf = tensorflow
+            tf.config.threading.set_intra_op_parallelism_threads(serving_config["intra_op_threads"])
+            tf.config.threading.set_inter_op_parallelism_threads(serving_config["inter_op_threads"])
+        startup_timings[f"{INFERENCE_BACKEND}_import_s"] = time.perf_counter() - started
+        
+        startup_phase = "loading"
+        phase_start = time.perf_counter()
+        loaded = load_model()
+        startup_timings["model_load_s"] = time.perf_counter() - phase_start
+        
+        if loaded:
+            startup_phase = "warming_up"
+            phase_start = time.perf_counter()
+            build_inference_fns()
+            if CASCADE_ENABLED:
+                load_fast_model()
+            startup_timings["warmup_s"] = time.perf_counter() - phase_start
+            
+            job_pool.start()
+            startup_phase = "ready"
+            print("API Ready! Model is loaded and ready for predictions.")
+        else:
+            startup_phase = "failed"
+            print("API started but model failed to load")
+    except Exception as e:
+        startup_phase = "failed"
+        print(f"Startup failed: {e}")
+    finally:
+        startup_timings["startup_s"] = time.perf_counter() - started
+        print_startup_report()
+        # Wake requests queued while the model was loading, whether it loaded or not
+        loop.call_soon_threadsafe(ready_event.set)
+
+def print_startup_report():
+    print("=" * 50)
+    print(f"Startup report ({startup_phase})")
+    for name, seconds in startup_timings.items():
+        print(f"  {name:<22}{seconds:>8.2f}s")
+    print("=" * 50)
+
+async def wait_until_ready():
+    """Hold a request until startup finishes or READY_TIMEOUT passes; True if the model is usable"""
+    if not ready_event.is_set():
+        try:
+            await asyncio.wait_for(ready_event.wait(), timeout=READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+    return startup_phase == "ready"
+
+def not_ready_error():
+    if startup_phase == "failed":
         return {"success": False, "error": "Model not loaded. Please check server logs."}
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "error": f"Model is still {startup_phase}, please retry shortly."},
+        headers={"Retry-After": "5"}
+    )
+
+os.makedirs(JOBS_DIR, exist_ok=True)
+job_store = JobStore(os.path.join(JOBS_DIR, "jobs.db"), os.path.join(JOBS_DIR, "images"))
+job_pool = JobWorkerPool(job_store, predict_batch, preprocess_image, class_names,
+                         batch_size=JOB_BATCH_SIZE, num_workers=JOB_WORKERS)
+
+history_store = None
+if HISTORY_ENABLED:
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    history_store = HistoryStore(os.path.join(HISTORY_DIR, "history.db"), os.path.join(HISTORY_DIR, "thumbnails"))
+    history_store.start()
+
+startup_timings["module_import_s"] = time.perf_counter() - _import_start
+
+@app.on_event("startup")
+async def startup():
+    global ready_event
+    ready_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    
+    # Pin here rather than at import: only server workers run the startup hook,
+    # not the `python app.py` supervisor whose affinity the workers would inherit.
+    # It also runs before the runtime thread pools exist, so they inherit the CPU set.
+    pin_worker(serving_config, os.path.dirname(os.path.abspath(__file__)))
+    
+    if BACKGROUND_STARTUP:
+        threading.Thread(target=run_startup, args=(loop,), name="model-startup", daemon=True).start()
+    else:
+        await loop.run_in_executor(None, run_startup, loop)
+
+@app.on_event("shutdown")
+async def shutdown():
+    if history_store is not None:
+        history_store.close()
+
+@app.post("/predict")
+async def predict(file: UploadFile = File(...), tiled: bool = False,
+                  x_device_id: Optional[str] = Header(None)):
+    if not await wait_until_ready():
+        return not_ready_error()
     
     try:
         print(f"Received image: {file.filename}")
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents)).convert('RGB')
-        
-        image = image.resize((224, 224))
-        img_array = np.array(image) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
         
         print("Analyzing image...")
-        predictions = model.predict(img_array, verbose=0)
-        predicted_class_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_class_idx])
+        # Model work runs in a thread so /live, /ready and job streams stay responsive
+        result = await run_in_threadpool(diagnose_image, contents, tiled)
         
-        print(f"Prediction: {class_names[predicted_class_idx]} ({confidence:.2%})")
+        if history_store is not None:
+            history_store.record(contents, x_device_id, result["disease"], result["confidence"],
+                                 result["all_predictions"])
         
-        return {
-            "success": True,
-            "disease": class_names[predicted_class_idx],
-            "confidence": confidence,
-            "all_predictions": {
-                class_names[i]: float(predictions[0][i]) for i in range(len(class_names))
-            }
-        }
+        return result
     except Exception as e:
         print(f"Prediction error: {e}")
         return {"success": False, "error": str(e)}
 
+def diagnose_image(contents, tiled=False):
+    """Decode one upload and diagnose it, whole or tiled; blocking, so call it off the event loop"""
+    image = Image.open(io.BytesIO(contents)).convert('RGB')
+    if tiled:
+        return tiled_predict(image)
+    
+    if fast_model is not None:
+        probs, served_by = cascade_predict(image)
+    else:
+        probs, served_by = run_inference(np.expand_dims(to_array(image), axis=0))[0], "full"
+    predicted_class_idx = np.argmax(probs)
+    confidence = float(probs[predicted_class_idx])
+    
+    print(f"Prediction: {class_names[predicted_class_idx]} ({confidence:.2%}, {served_by} model)")
+    
+    return {
+        "success": True,
+        "disease": class_names[predicted_class_idx],
+        "confidence": confidence,
+        "model": served_by,
+        "all_predictions": {
+            class_names[i]: float(probs[i]) for i in range(len(class_names))
+        }
+    }
+
+def tiled_predict(image):
+    """Diagnose a whole-branch photo from overlapping tiles in a single batched pass"""
+    tiles, grids = make_tiles(image, IMG_SIZE)
+    tile_probs = run_inference(tiles)
+    probs, heatmap = aggregate(tile_probs, grids, class_names)
+    
+    predicted_class_idx = np.argmax(probs)
+    confidence = float(probs[predicted_class_idx])
+    print(f"Tiled prediction: {class_names[predicted_class_idx]} ({confidence:.2%}, {len(tiles)} tiles)")
+    
+    return {
+        "success": True,
+        "disease": class_names[predicted_class_idx],
+        "confidence": confidence,
+        "model": "full",
+        "tiles": len(tiles),
+        "all_predictions": {
+            class_names[i]: float(probs[i]) for i in range(len(class_names))
+        },
+        "heatmap": heatmap
+    }
+
+@app.post("/jobs")
+async def create_job(files: List[UploadFile] = File(...)):
+    """Queue a bulk diagnosis job from image uploads and/or zip archives"""
+    if not await wait_until_ready():
+        return not_ready_error()
+    
+    try:
+        # The multipart parser has already spooled large uploads to temp files;
+        # unpacking and copying them to the job store happens off the event loop.
+        uploads = [(f.filename, f.file) for f in files]
+        job_id, total = await run_in_threadpool(job_store.create_job, read_uploads(uploads))
+        if job_id is None:
+            return {"success": False, "error": "No images found in upload."}
+        
+        job_pool.submit(job_id)
+        print(f"Queued job {job_id} with {total} images")
+        
+        return {"success": True, "job_id": job_id, "total": total}
+    except Exception as e:
+        print(f"Job creation error: {e}")
+        return {"success": False, "error": str(e)}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Poll the progress of a bulk diagnosis job"""
+    job = job_store.get_job(job_id)
+    if job is None:
+        return {"success": False, "error": "Job not found"}
+    return {"success": True, **job}
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream job progress as server-sent events until the job finishes"""
+    async def events():
+        while True:
+            job = job_store.get_job(job_id)
+            if job is None:
+                yield f"data: {json.dumps({'error': 'Job not found'})}\n\n"
+                return
+            yield f"data: {json.dumps(job)}\n\n"
+            if job["status"] in ("completed", "failed"):
+                return
+            await asyncio.sleep(1)
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    """Per-image results and a per-class summary for a bulk diagnosis job"""
+    job = job_store.get_job(job_id)
+    if job is None:
+        return {"success": False, "error": "Job not found"}
+    
+    results = job_store.get_results(job_id)
+    return {
+        "success": True,
+        "job": job,
+        "summary": summarize(results, class_names),
+        "results": results
+    }
+
+@app.get("/history")
+async def history(device_id: Optional[str] = None, disease: Optional[str] = None,
+                  since: Optional[float] = None, until: Optional[float] = None,
+                  cursor: Optional[str] = None, limit: int = 50):
+    """Newest-first diagnosis history; pass next_cursor back as cursor for the next page"""
+    if history_store is None:
+        return {"success": False, "error": "History is disabled on this server."}
+    
+    try:
+        items, next_cursor = history_store.query(device_id, disease, since, until, cursor, min(max(limit, 1), 200))
+    except ValueError:
+        return {"success": False, "error": "Invalid cursor"}
+    return {"success": True, "items": items, "next_cursor": next_cursor}
+
+@app.get("/history/stats")
+async def history_stats(period: str = "week", device_id: Optional[str] = None,
+                        since: Optional[float] = None, until: Optional[float] = None):
+    """Diagnosis counts per disease per day, week or month"""
+    if history_store is None:
+        return {"success": False, "error": "History is disabled on this server."}
+    if period not in PERIOD_FORMATS:
+        return {"success": False, "error": f"period must be one of {list(PERIOD_FORMATS)}"}
+    
+    return {"success": True, "period": period,
+            "counts": history_store.disease_counts(period, device_id, since, until)}
+
+@app.get("/history/thumbnails/{name}")
+async def history_thumbnail(name: str):
+    if history_store is None:
+        return {"success": False, "error": "History is disabled on this server."}
+    
+    path = os.path.join(history_store.thumbnails_dir, os.path.basename(name))
+    if not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"success": False, "error": "Thumbnail not found"})
+    return FileResponse(path, media_type="image/jpeg")
+
+@app.get("/cascade-stats")
+async def cascade_stats_endpoint():
+    """Escalation rate and average latency saved by the confidence cascade"""
+    return {
+        "enabled": fast_model is not None,
+        "thresholds": cascade_thresholds,
+        **cascade_stats.snapshot()
+    }
+
 @app.get("/")
 async def root():
     return {
         "status": "OK", 
         "message": "Mango Disease Detection API",
         "model_loaded": model is not None,
+        "phase": startup_phase,
         "endpoints": {
             "health": "/health",
-            "predict": "/predict (POST)"
+            "live": "/live",
+            "ready": "/ready",
+            "startup_report": "/startup-report",
+            "predict": "/predict (POST), /predict?tiled=true for whole-branch photos",
+            "cascade_stats": "/cascade-stats",
+            "history": "/history, /history/stats, /history/thumbnails/{name}",
+            "jobs": "/jobs (POST), /jobs/{job_id}, /jobs/{job_id}/events, /jobs/{job_id}/results"
         }
     }
 
 @app.get("/health")
 async def health():
     return {
-        "status": "healthy", 
+        "status": "healthy" if startup_phase == "ready" else startup_phase,
         "model_loaded": model is not None,
         "timestamp": np.datetime64('now').astype(str)
     }
 
+@app.get("/live")
+async def live():
+    """Liveness: the process is up and serving, whether or not the model is loaded"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 only once the model is loaded and warmed up"""
+    if startup_phase != "ready":
+        return JSONResponse(status_code=503, content={"status": startup_phase})
+    return {"status": "ready"}
+
+@app.get("/startup-report")
+async def startup_report():
+    """Time spent importing, loading and warming up during startup"""
+    return {"phase": startup_phase, "timings": startup_timings}
+
 @app.get("/model-info")
 async def model_info():
     """Endpoint to check model details"""
@@ -133,9 +562,11 @@ async def model_info():
     
     return {
         "model_loaded": True,
+        "backend": INFERENCE_BACKEND,
         "input_shape": model.input_shape,
         "output_shape": model.output_shape,
         "num_classes": len(class_names),
+        "batch_buckets": list(BATCH_BUCKETS),
         "classes": class_names
     }
 
@@ -147,12 +578,16 @@ if __name__ == "__main__":
     print("Local: http://localhost:8000")
     print("Health: http://localhost:8000/health")
     print("Model Info: http://localhost:8000/model-info")
+    print(f"Workers: {serving_config['workers']}")
     print("=" * 50)
     
+    # A tuned host is a serving host: run the tuned worker count without auto-reload
+    tuned = "cpu_count" in serving_config
     uvicorn.run(
         "app:app",
         host="0.0.0.0", 
         port=8000, 
-        reload=True,
+        reload=not tuned,
+        workers=serving_config["workers"],
         log_level="info"
     )
\ No newline at end of file
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# Used when no calibration file exists yet; run calibrate_cascade.py to replace them
+DEFAULT_THRESHOLDS = {"confidence_threshold": 0.9, "margin_threshold": 0.5}
+
+
+class TFLiteClassifier:
+    """Small wrapper around a (possibly quantised) TFLite classifier"""
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            # The standalone runtime avoids pulling all of TensorFlow into an ONNX server
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.img_size = tuple(int(d) for d in self.input_details["shape"][1:3])
+        # The interpreter keeps its tensors between invoke() calls
+        self.lock = threading.Lock()
+
+    def predict(self, image):
+        """Class probabilities for one (H, W, 3) image normalized to [0, 1]"""
+        data = np.expand_dims(image, axis=0)
+
+        scale, zero_point = self.input_details["quantization"]
+        if self.input_details["dtype"] in (np.uint8, np.int8) and scale:
+            data = np.round(data / scale + zero_point)
+        data = data.astype(self.input_details["dtype"])
+
+        with self.lock:
+            self.interpreter.set_tensor(self.input_details["index"], data)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output_details["index"])[0]
+
+        scale, zero_point = self.output_details["quantization"]
+        if self.output_details["dtype"] in (np.uint8, np.int8) and scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output.astype(np.float32)
+
+
+def load_thresholds(config_path):
+    """Read the thresholds written by calibrate_cascade.py, falling back to defaults"""
+    if config_path and os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+        print(f"Loaded cascade thresholds from: {config_path}")
+        return {key: float(config[key]) for key in DEFAULT_THRESHOLDS}
+
+    print("No cascade calibration found, using default thresholds")
+    return dict(DEFAULT_THRESHOLDS)
+
+
+def is_confident(probs, thresholds):
+    """True when the fast model's answer can be returned without escalating"""
+    top2 = np.sort(probs)[-2:]
+    margin = top2[1] - top2[0]
+    return top2[1] >= thresholds["confidence_threshold"] and margin >= thresholds["margin_threshold"]
+
+
+class CascadeStats:
+    """Running escalation rate and latency counters for the cascade"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.escalations = 0
+        self.fast_ms = 0.0
+        self.full_ms = 0.0
+
+    def record(self, fast_ms, full_ms=None):
+        with self.lock:
+            self.requests += 1
+            self.fast_ms += fast_ms
+            if full_ms is not None:
+                self.escalations += 1
+                self.full_ms += full_ms
+
+    def snapshot(self):
+        with self.lock:
+            if not self.requests:
+                return {"requests": 0, "escalations": 0, "escalation_rate": None}
+
+            escalation_rate = self.escalations / self.requests
+            avg_fast_ms = self.fast_ms / self.requests
+            stats = {
+                "requests": self.requests,
+                "escalations": self.escalations,
+                "escalation_rate": escalation_rate,
+                "avg_fast_ms": avg_fast_ms,
+                "avg_full_ms": None,
+                "avg_latency_ms": (self.fast_ms + self.full_ms) / self.requests,
+                "avg_latency_saved_ms": None,
+            }
+            if self.escalations:
+                # Compared with running the full model on every request
+                avg_full_ms = self.full_ms / self.escalations
+                stats["avg_full_ms"] = avg_full_ms
+                stats["avg_latency_saved_ms"] = avg_full_ms - stats["avg_latency_ms"]
+            return stats
@@ -0,0 +1,207 @@
+import hashlib
+import io
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+THUMBNAIL_SIZE = (128, 128)
+WRITE_BATCH_SIZE = 64
+FLUSH_INTERVAL = 1.0
+
+PERIOD_FORMATS = {
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m",
+}
+
+
+def encode_cursor(created_at, row_id):
+    return f"{created_at!r}_{row_id}"
+
+
+def decode_cursor(cursor):
+    created_at, row_id = cursor.rsplit("_", 1)
+    return float(created_at), int(row_id)
+
+
+class HistoryStore:
+    """SQLite diagnosis history, written in batches by a background thread"""
+
+    def __init__(self, db_path, thumbnails_dir):
+        self.db_path = db_path
+        self.thumbnails_dir = thumbnails_dir
+        self.queue = queue.Queue()
+        self.thread = None
+        os.makedirs(self.thumbnails_dir, exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS diagnoses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device_id TEXT,
+                    content_hash TEXT NOT NULL,
+                    thumbnail TEXT,
+                    disease TEXT NOT NULL,
+                    confidence REAL NOT NULL,
+                    probabilities TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_diagnoses_device
+                    ON diagnoses (device_id, created_at, id);
+                CREATE INDEX IF NOT EXISTS idx_diagnoses_time
+                    ON diagnoses (created_at, id);
+                CREATE INDEX IF NOT EXISTS idx_diagnoses_disease
+                    ON diagnoses (disease, created_at);
+                CREATE INDEX IF NOT EXISTS idx_diagnoses_hash
+                    ON diagnoses (content_hash);
+            """)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Flush anything still queued and stop the writer"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout=10)
+            self.thread = None
+
+    def record(self, contents, device_id, disease, confidence, probabilities):
+        """Queue a diagnosis; hashing, thumbnailing and the insert happen on the writer thread"""
+        self.queue.put((contents, device_id, disease, confidence, probabilities, time.time()))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            stop = item is None
+            batch = [] if stop else [item]
+
+            # Collect whatever else arrives within the flush interval
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while not stop and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    print(f"History write failed ({len(batch)} records): {e}")
+            if stop:
+                return
+
+    def _write(self, batch):
+        rows = []
+        for contents, device_id, disease, confidence, probabilities, created_at in batch:
+            content_hash = hashlib.sha256(contents).hexdigest()
+            rows.append((
+                device_id,
+                content_hash,
+                self._save_thumbnail(content_hash, contents),
+                disease,
+                confidence,
+                json.dumps(probabilities),
+                created_at,
+            ))
+
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO diagnoses (device_id, content_hash, thumbnail, disease, confidence, probabilities, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def _save_thumbnail(self, content_hash, contents):
+        """Store one thumbnail per distinct image and return its file name"""
+        name = f"{content_hash}.jpg"
+        path = os.path.join(self.thumbnails_dir, name)
+        if not os.path.exists(path):
+            try:
+                image = Image.open(io.BytesIO(contents)).convert('RGB')
+                image.thumbnail(THUMBNAIL_SIZE)
+                image.save(path, "JPEG", quality=80)
+            except Exception as e:
+                print(f"Thumbnail failed for {content_hash}: {e}")
+                return None
+        return name
+
+    def query(self, device_id=None, disease=None, since=None, until=None, cursor=None, limit=50):
+        """Newest-first diagnoses, paginated by a (created_at, id) cursor"""
+        clauses, params = [], []
+        if device_id is not None:
+            clauses.append("device_id = ?")
+            params.append(device_id)
+        if disease is not None:
+            clauses.append("disease = ?")
+            params.append(disease)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor is not None:
+            created_at, row_id = decode_cursor(cursor)
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([created_at, created_at, row_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM diagnoses {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+
+        items = []
+        for row in rows[:limit]:
+            item = dict(row)
+            item["probabilities"] = json.loads(item["probabilities"])
+            items.append(item)
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return items, next_cursor
+
+    def disease_counts(self, period="week", device_id=None, since=None, until=None):
+        """Diagnosis counts per disease per day, week or month"""
+        clauses, params = [], []
+        if device_id is not None:
+            clauses.append("device_id = ?")
+            params.append(device_id)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT strftime(?, created_at, 'unixepoch') AS period, disease, COUNT(*) AS count "
+                f"FROM diagnoses {where} GROUP BY period, disease ORDER BY period, disease",
+                (PERIOD_FORMATS[period], *params)
+            ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,315 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+# A running job whose last batch is older than this is assumed to have lost its worker
+STALE_AFTER = 60
+POLL_INTERVAL = 2.0
+
+
+class JobStore:
+    """SQLite-backed state for bulk diagnosis jobs, so jobs survive a restart"""
+
+    def __init__(self, db_path, images_dir):
+        self.db_path = db_path
+        self.images_dir = images_dir
+        self.lock = threading.Lock()
+        os.makedirs(self.images_dir, exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self.lock, self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    error TEXT
+                );
+                CREATE TABLE IF NOT EXISTS job_images (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    disease TEXT,
+                    confidence REAL,
+                    predictions TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, idx)
+                );
+                CREATE INDEX IF NOT EXISTS idx_job_images_status
+                    ON job_images (job_id, status);
+            """)
+
+    def create_job(self, files):
+        """Copy (filename, file object) pairs to disk one at a time and register a queued job.
+
+        Returns (job_id, total); job_id is None when there were no images.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.images_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        rows = []
+        for idx, (filename, source) in enumerate(files):
+            # Never trust archive paths, only keep the index and extension
+            path = os.path.join(job_dir, f"{idx:06d}{os.path.splitext(filename)[1].lower()}")
+            with open(path, "wb") as f:
+                shutil.copyfileobj(source, f)
+            rows.append((job_id, idx, filename, path))
+
+        if not rows:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return None, 0
+
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, total, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, len(rows), now, now)
+            )
+            conn.executemany(
+                "INSERT INTO job_images (job_id, idx, filename, path) VALUES (?, ?, ?, ?)",
+                rows
+            )
+        return job_id, len(rows)
+
+    def set_status(self, job_id, status, error=None):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def pending_images(self, job_id, limit):
+        with self.lock, self._connect() as conn:
+            return conn.execute(
+                "SELECT idx, path FROM job_images WHERE job_id = ? AND status = 'pending' ORDER BY idx LIMIT ?",
+                (job_id, limit)
+            ).fetchall()
+
+    def save_results(self, job_id, results):
+        """Persist one batch of (idx, disease, confidence, predictions, error) results"""
+        done = [(d, c, json.dumps(p), job_id, i) for i, d, c, p, e in results if e is None]
+        failed = [(e, job_id, i) for i, d, c, p, e in results if e is not None]
+
+        with self.lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE job_images SET status = 'done', disease = ?, confidence = ?, predictions = ? "
+                "WHERE job_id = ? AND idx = ?",
+                done
+            )
+            conn.executemany(
+                "UPDATE job_images SET status = 'failed', error = ? WHERE job_id = ? AND idx = ?",
+                failed
+            )
+            conn.execute(
+                "UPDATE jobs SET processed = processed + ?, failed = failed + ?, updated_at = ? WHERE id = ?",
+                (len(results), len(failed), time.time(), job_id)
+            )
+
+    def delete_images(self, job_id, paths=None):
+        """Remove uploaded images once their results are stored; the whole job directory when paths is None"""
+        if paths is None:
+            shutil.rmtree(os.path.join(self.images_dir, job_id), ignore_errors=True)
+            return
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_job(self, job_id):
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = job["processed"] / job["total"] if job["total"] else 1.0
+        return job
+
+    def get_results(self, job_id):
+        with self.lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT idx, filename, status, disease, confidence, predictions, error "
+                "FROM job_images WHERE job_id = ? ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+
+        results = []
+        for row in rows:
+            result = dict(row)
+            result["predictions"] = json.loads(result["predictions"]) if result["predictions"] else None
+            results.append(result)
+        return results
+
+    def claim_next_job(self):
+        """Atomically move the oldest queued job to running; safe across server processes"""
+        with self.lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?",
+                (time.time(), row["id"])
+            )
+        return row["id"]
+
+    def requeue_stale_jobs(self):
+        """Put running jobs back in the queue when their worker died (e.g. a restart)"""
+        with self.lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'running' AND updated_at < ?",
+                (time.time() - STALE_AFTER,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'queued' WHERE id = ?",
+                [(row["id"],) for row in rows]
+            )
+        return [row["id"] for row in rows]
+
+
+def read_uploads(uploads):
+    """Yield (filename, file object) for each image in the uploads, unpacking any zip archives.
+
+    Uploads are (filename, seekable file object) pairs, so archives are read
+    member by member instead of being loaded into memory whole.
+    """
+    for filename, source in uploads:
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(source) as archive:
+                for member in archive.infolist():
+                    name = member.filename
+                    if member.is_dir() or os.path.basename(name).startswith('.'):
+                        continue
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        with archive.open(member) as image:
+                            yield name, image
+        elif filename.lower().endswith(IMAGE_EXTENSIONS):
+            yield filename, source
+
+
+def summarize(results, class_names):
+    """Per-class counts and mean confidence for a finished job"""
+    summary = {name: {"count": 0, "mean_confidence": 0.0} for name in class_names}
+    failed = 0
+    for result in results:
+        if result["status"] != "done":
+            failed += int(result["status"] == "failed")
+            continue
+        entry = summary[result["disease"]]
+        entry["count"] += 1
+        entry["mean_confidence"] += result["confidence"]
+
+    for entry in summary.values():
+        if entry["count"]:
+            entry["mean_confidence"] /= entry["count"]
+
+    return {
+        "total": len(results),
+        "failed": failed,
+        "classes": summary,
+    }
+
+
+class JobWorkerPool:
+    """Background threads that run queued jobs through the model in batches"""
+
+    def __init__(self, store, predict_batch, load_image, class_names, batch_size=32, num_workers=2):
+        self.store = store
+        self.predict_batch = predict_batch
+        self.load_image = load_image
+        self.class_names = class_names
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.wakeup = threading.Event()
+        self.threads = []
+
+    def start(self):
+        """Start the workers; they pick up queued jobs, including ones left from a previous run"""
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, job_id):
+        self.wakeup.set()
+
+    def _run(self):
+        # Jobs are claimed from the database rather than an in-memory queue, so
+        # several server worker processes can share one job store.
+        while True:
+            for job_id in self.store.requeue_stale_jobs():
+                print(f"Resuming job: {job_id}")
+
+            job_id = self.store.claim_next_job()
+            if job_id is None:
+                self.wakeup.wait(POLL_INTERVAL)
+                self.wakeup.clear()
+                continue
+
+            try:
+                self._process(job_id)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                self.store.set_status(job_id, "failed", str(e))
+            # Finished and failed jobs are never picked up again
+            self.store.delete_images(job_id)
+
+    def _process(self, job_id):
+        print(f"Processing job: {job_id}")
+
+        while True:
+            pending = self.store.pending_images(job_id, self.batch_size)
+            if not pending:
+                break
+
+            results = []
+            images, indices = [], []
+            for row in pending:
+                try:
+                    with open(row["path"], "rb") as f:
+                        images.append(self.load_image(f.read()))
+                    indices.append(row["idx"])
+                except Exception as e:
+                    results.append((row["idx"], None, None, None, str(e)))
+
+            if images:
+                predictions = self.predict_batch(images)
+                for idx, probs in zip(indices, predictions):
+                    top = int(probs.argmax())
+                    results.append((
+                        idx,
+                        self.class_names[top],
+                        float(probs[top]),
+                        {self.class_names[i]: float(probs[i]) for i in range(len(self.class_names))},
+                        None
+                    ))
+
+            self.store.save_results(job_id, results)
+            # Only results are served after this, so large surveys do not fill the disk
+            self.store.delete_images(job_id, [row["path"] for row in pending])
+
+        self.store.set_status(job_id, "completed")
+        print(f"Job completed: {job_id}")
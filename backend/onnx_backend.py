@@ -0,0 +1,28 @@
+import numpy as np
+
+
+class OnnxModel:
+    """ONNX Runtime session exposing the bits of the Keras model the server uses"""
+
+    def __init__(self, model_path, intra_op_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # A single MobileNetV2 graph has no parallel branches worth an inter-op pool
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        options.intra_op_num_threads = intra_op_threads or 0
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        model_output = self.session.get_outputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = tuple(d if isinstance(d, int) else None for d in model_input.shape)
+        self.output_shape = tuple(d if isinstance(d, int) else None for d in model_output.shape)
+
+    def predict(self, images):
+        """Class probabilities for a (N, H, W, 3) float array"""
+        return self.session.run(None, {self.input_name: images.astype(np.float32, copy=False)})[0]
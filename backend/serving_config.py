@@ -0,0 +1,79 @@
+import json
+import os
+
+# Used when tune_serving.py has not been run on this host
+DEFAULT_SERVING_CONFIG = {
+    "workers": 1,
+    "intra_op_threads": 0,
+    "inter_op_threads": 0,
+    "cpu_pinning": False,
+    "batch_size": None,
+}
+
+_cpu_slot_lock = None
+
+
+def load_serving_config(config_path, backend):
+    """Read the tuned worker/thread/batch topology, falling back to defaults.
+
+    A config tuned for a different inference backend is ignored, since thread
+    counts and batch sizes do not carry over between TensorFlow and ONNX Runtime.
+    """
+    config = dict(DEFAULT_SERVING_CONFIG)
+    if not os.path.exists(config_path):
+        return config
+
+    with open(config_path) as f:
+        tuned = json.load(f)
+
+    tuned_backend = tuned.get("backend", backend)
+    if tuned_backend != backend:
+        print(f"Warning: {config_path} was tuned for '{tuned_backend}' but the server runs '{backend}'; "
+              f"ignoring it. Re-run tune_serving.py with BACKEND = \"{backend}\".")
+        return config
+
+    config.update(tuned)
+    print(f"Loaded serving config from: {config_path}")
+    return config
+
+
+def cpu_sets(workers, threads_per_worker, cpus=None):
+    """Split the CPUs into one disjoint set per worker.
+
+    Never derived from the current affinity mask: a worker forked from a pinned
+    parent would only see the parent's CPUs.
+    """
+    if cpus is None:
+        cpus = list(range(os.cpu_count()))
+    return [cpus[i * threads_per_worker:(i + 1) * threads_per_worker] for i in range(workers)]
+
+
+def pin_worker(config, lock_dir):
+    """Pin this server process to a free CPU set from the tuned topology.
+
+    uvicorn does not tell a worker its index, so each worker claims the first
+    slot whose lock file it can hold; the lock is released when the process exits.
+    Returns the pinned CPUs, or None when pinning is off or unsupported.
+    """
+    global _cpu_slot_lock
+    if not config["cpu_pinning"] or not hasattr(os, "sched_setaffinity"):
+        return None
+
+    import fcntl
+
+    sets = cpu_sets(config["workers"], max(config["intra_op_threads"], 1), config.get("cpus"))
+    for slot, cpus in enumerate(sets):
+        if not cpus:
+            break
+        lock = open(os.path.join(lock_dir, f".cpu_slot_{slot}.lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        _cpu_slot_lock = lock
+        os.sched_setaffinity(0, cpus)
+        print(f"Pinned worker to CPUs {cpus} (slot {slot})")
+        return cpus
+
+    return None
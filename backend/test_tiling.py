@@ -0,0 +1,35 @@
+import numpy as np
+
+from tiling import aggregate
+
+CLASS_NAMES = ["Anthracnose", "Bacterial Canker", "Cutting Weevil", "Die Back", "Gall Midge", "Healthy",
+               "Powdery Mildew", "Sooty Mould"]
+TILES = 19
+
+
+def tile(top_class, confidence):
+    """One tile's probabilities with the remainder spread over the other classes"""
+    probs = np.full(len(CLASS_NAMES), (1 - confidence) / (len(CLASS_NAMES) - 1), dtype=np.float32)
+    probs[CLASS_NAMES.index(top_class)] = confidence
+    return probs
+
+
+def diagnose(tiles):
+    probs, _ = aggregate(np.stack(tiles), [], CLASS_NAMES)
+    return CLASS_NAMES[int(np.argmax(probs))]
+
+
+def test_healthy_branch_stays_healthy():
+    assert diagnose([tile("Healthy", 0.95)] * TILES) == "Healthy"
+
+
+def test_small_lesion_is_not_outvoted_by_healthy_tiles():
+    for lesion_tiles in range(1, 5):
+        tiles = [tile("Anthracnose", 0.9)] * lesion_tiles + [tile("Healthy", 0.95)] * (TILES - lesion_tiles)
+        assert diagnose(tiles) == "Anthracnose", lesion_tiles
+
+
+def test_one_uncertain_tile_does_not_flag_disease():
+    uncertain = tile("Healthy", 0.5)
+    uncertain[CLASS_NAMES.index("Anthracnose")] = 0.4
+    assert diagnose([uncertain] + [tile("Healthy", 0.95)] * (TILES - 1)) == "Healthy"
@@ -0,0 +1,103 @@
+import math
+
+import numpy as np
+
+# Short side (px) the photo is resized to for each tiling scale, coarsest first
+TILE_SHORT_SIDES = (336, 448)
+TILE_OVERLAP = 0.25
+# Wider panoramas are centre-cropped so the tile count stays bounded
+MAX_ASPECT = 2.0
+MAX_TILES = 32
+# Per disease class, image-level score is the mean of its k most confident tiles
+TOP_K = 3
+
+
+def tile_positions(length, tile, stride):
+    """Tile offsets along one axis, with the last tile flush against the edge"""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / stride) + 1
+    return sorted({min(i * stride, length - tile) for i in range(count)})
+
+
+def crop_aspect(image):
+    """Centre-crop the long side to at most MAX_ASPECT times the short side"""
+    width, height = image.size
+    if width > height * MAX_ASPECT:
+        new_width = int(height * MAX_ASPECT)
+        left = (width - new_width) // 2
+        return image.crop((left, 0, left + new_width, height))
+    if height > width * MAX_ASPECT:
+        new_height = int(width * MAX_ASPECT)
+        top = (height - new_height) // 2
+        return image.crop((0, top, width, top + new_height))
+    return image
+
+
+def make_tiles(image, tile_size):
+    """Cut a PIL image into overlapping tiles at each scale, plus one whole-image view.
+
+    Returns the stacked tile array and, per scale, the grid layout so results
+    can be mapped back into a heatmap. Scales that would push the total past
+    MAX_TILES are skipped.
+    """
+    image = crop_aspect(image)
+    tile = tile_size[0]
+    stride = int(tile * (1 - TILE_OVERLAP))
+
+    arrays = [np.array(image.resize(tile_size), dtype=np.float32) / 255.0]
+    grids = []
+
+    for short_side in TILE_SHORT_SIDES:
+        scale = short_side / min(image.size)
+        width, height = round(image.size[0] * scale), round(image.size[1] * scale)
+        xs = tile_positions(width, tile, stride)
+        ys = tile_positions(height, tile, stride)
+
+        if len(arrays) + len(xs) * len(ys) > MAX_TILES:
+            break
+
+        scaled = np.array(image.resize((width, height)), dtype=np.float32) / 255.0
+        start = len(arrays)
+        for y in ys:
+            for x in xs:
+                arrays.append(scaled[y:y + tile, x:x + tile])
+
+        grids.append({"short_side": short_side, "rows": len(ys), "cols": len(xs), "start": start})
+
+    return np.stack(arrays), grids
+
+
+def aggregate(tile_probs, grids, class_names, healthy_class="Healthy"):
+    """Image-level probabilities and a coarse per-scale disease heatmap.
+
+    Disease classes are top-k pooled, so a lesion visible in a few tiles is not
+    averaged away. Healthy is not: on a branch photo most tiles are confidently
+    healthy, so its top-k would always win. The photo is only as healthy as its
+    least healthy tile instead.
+    """
+    healthy_idx = class_names.index(healthy_class)
+    k = min(TOP_K, len(tile_probs))
+    scores = np.sort(tile_probs, axis=0)[-k:].mean(axis=0)
+    scores[healthy_idx] = tile_probs[:, healthy_idx].min()
+    probs = scores / scores.sum()
+
+    heatmap = []
+    for grid in grids:
+        count = grid["rows"] * grid["cols"]
+        scale_probs = tile_probs[grid["start"]:grid["start"] + count]
+        disease_probability = 1.0 - scale_probs[:, healthy_idx]
+        top_classes = np.argmax(scale_probs, axis=1)
+
+        heatmap.append({
+            "short_side": grid["short_side"],
+            "rows": grid["rows"],
+            "cols": grid["cols"],
+            "disease_probability": disease_probability.reshape(grid["rows"], grid["cols"]).round(4).tolist(),
+            "top_class": [
+                [class_names[i] for i in row]
+                for row in top_classes.reshape(grid["rows"], grid["cols"])
+            ],
+        })
+
+    return probs, heatmap
@@ -0,0 +1,216 @@
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import numpy as np
+
+from serving_config import cpu_sets
+
+# Same model the server loads; set BACKEND to match INFERENCE_BACKEND in app.py
+BACKEND = "tensorflow"
+MODEL_PATH = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango_disease_model.keras"
+ONNX_MODEL_PATH = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango_disease_model.onnx"
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serving_config.json")
+
+IMG_SIZE = (224, 224)
+# Applies to interactive /predict traffic, which always runs batch size 1
+P95_TARGET_MS = 200
+# Must be warmed bucket sizes in app.py (BATCH_BUCKETS); 1 is required for the latency check
+BATCH_SIZES = (1, 4, 8, 16, 32)
+DURATION_S = 10
+WARMUP_S = 2
+# Longest a worker may take to load the model and measure one batch size; a
+# worker that died (e.g. out of memory) would otherwise leave the others waiting
+WORKER_TIMEOUT_S = 300
+
+
+def load_predict_fn(backend, model_path, threads):
+    """Load the model inside a worker with the given per-worker thread count"""
+    if backend == "onnx":
+        from onnx_backend import OnnxModel
+        return OnnxModel(model_path, threads).predict
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    model = tf.keras.models.load_model(model_path)
+
+    @tf.function
+    def infer(images):
+        return model(images, training=False)
+
+    return lambda images: infer(tf.constant(images)).numpy()
+
+
+def benchmark_worker(backend, model_path, threads, cpus, batch_sizes, barrier, results):
+    """One simulated server worker: closed-loop inference on synthetic images"""
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+    predict = load_predict_fn(backend, model_path, threads)
+    rng = np.random.default_rng(os.getpid())
+
+    for batch_size in batch_sizes:
+        images = rng.random((batch_size, *IMG_SIZE, 3), dtype=np.float32)
+        warmup_end = time.perf_counter() + WARMUP_S
+        while time.perf_counter() < warmup_end:
+            predict(images)
+
+        # All workers measure the same window so they contend like real workers
+        barrier.wait(WORKER_TIMEOUT_S)
+        latencies = []
+        end = time.perf_counter() + DURATION_S
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            predict(images)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        results.put((batch_size, latencies))
+        barrier.wait(WORKER_TIMEOUT_S)
+
+
+def run_topology(workers, threads, pinning, available_cpus):
+    """Measure every batch size for one worker/thread/pinning combination.
+
+    Returns None when a worker crashes or stops reporting, so the caller can skip it.
+    """
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    model_path = ONNX_MODEL_PATH if BACKEND == "onnx" else MODEL_PATH
+    sets = cpu_sets(workers, threads, available_cpus) if pinning else [None] * workers
+
+    processes = [
+        ctx.Process(target=benchmark_worker,
+                    args=(BACKEND, model_path, threads, sets[i], BATCH_SIZES, barrier, results))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    latencies = {batch_size: [] for batch_size in BATCH_SIZES}
+    received = 0
+    deadline = time.monotonic() + WORKER_TIMEOUT_S
+    while received < workers * len(BATCH_SIZES):
+        try:
+            batch_size, worker_latencies = results.get(timeout=1.0)
+        except queue.Empty:
+            failed = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+            if failed or time.monotonic() > deadline:
+                reason = f"worker exit codes {failed}" if failed else f"no result within {WORKER_TIMEOUT_S} s"
+                print(f"  failed: {reason}, skipping this topology")
+                barrier.abort()
+                for process in processes:
+                    process.terminate()
+                    process.join()
+                return None
+            continue
+        latencies[batch_size].extend(worker_latencies)
+        received += 1
+        deadline = time.monotonic() + WORKER_TIMEOUT_S
+
+    for process in processes:
+        process.join()
+
+    rows = []
+    for batch_size, values in latencies.items():
+        # A request waits for its whole batch, so batch latency is request latency
+        rows.append({
+            "workers": workers,
+            "intra_op_threads": threads,
+            "cpu_pinning": pinning,
+            "batch_size": batch_size,
+            "throughput": len(values) * batch_size / DURATION_S,
+            "p50_latency_ms": float(np.percentile(values, 50)),
+            "p95_latency_ms": float(np.percentile(values, 95)),
+        })
+    return rows
+
+
+def candidate_topologies(cpu_count, pinning_supported):
+    """Worker and thread counts (powers of two) that fit in the available CPUs"""
+    counts = [n for n in (1, 2, 4, 8, 16, 32) if n <= cpu_count]
+    for workers in counts:
+        for threads in counts:
+            if workers * threads > cpu_count:
+                continue
+            yield workers, threads, False
+            if pinning_supported:
+                yield workers, threads, True
+
+
+def main():
+    model_path = ONNX_MODEL_PATH if BACKEND == "onnx" else MODEL_PATH
+    if not os.path.exists(model_path):
+        print(f"Error: Model '{model_path}' not found!")
+        return
+
+    pinning_supported = hasattr(os, "sched_setaffinity")
+    available_cpus = sorted(os.sched_getaffinity(0)) if pinning_supported else list(range(os.cpu_count()))
+    cpu_count = len(available_cpus)
+
+    print("=" * 70)
+    print("SERVING TOPOLOGY TUNER")
+    print(f"Backend: {BACKEND}, CPUs: {cpu_count}, p95 target: {P95_TARGET_MS} ms")
+    print("=" * 70)
+
+    rows = []
+    for workers, threads, pinning in candidate_topologies(cpu_count, pinning_supported):
+        print(f"\nWorkers {workers}, threads {threads}, pinning {'on' if pinning else 'off'}")
+        topology_rows = run_topology(workers, threads, pinning, available_cpus)
+        if topology_rows is None:
+            continue
+        for row in topology_rows:
+            print(f"  batch {row['batch_size']:>3}: {row['throughput']:>8.1f} img/s, "
+                  f"p95 {row['p95_latency_ms']:>8.1f} ms")
+            rows.append(row)
+
+    # /predict always runs batch 1, so the topology is chosen on batch-1 rows only
+    interactive = [row for row in rows if row["batch_size"] == 1]
+    if not interactive:
+        print("\nError: every topology failed; no serving config written")
+        return
+
+    within_target = [row for row in interactive if row["p95_latency_ms"] <= P95_TARGET_MS]
+    if not within_target:
+        print(f"\nNo configuration met the {P95_TARGET_MS} ms p95 target at batch 1; using the lowest-latency one")
+        best = min(interactive, key=lambda row: row["p95_latency_ms"])
+    else:
+        best = max(within_target, key=lambda row: row["throughput"])
+
+    def same_topology(row):
+        return all(row[key] == best[key] for key in ("workers", "intra_op_threads", "cpu_pinning"))
+
+    # Bulk jobs have no latency target, so their batch size just maximises throughput
+    job_best = max((row for row in rows if same_topology(row)), key=lambda row: row["throughput"])
+
+    config = {
+        "backend": BACKEND,
+        "workers": best["workers"],
+        "intra_op_threads": best["intra_op_threads"],
+        "inter_op_threads": 1,
+        "cpu_pinning": best["cpu_pinning"],
+        "batch_size": job_best["batch_size"],
+        "p95_target_ms": P95_TARGET_MS,
+        "measured_throughput": best["throughput"],
+        "measured_p95_latency_ms": best["p95_latency_ms"],
+        "measured_job_throughput": job_best["throughput"],
+        "cpu_count": cpu_count,
+        # The CPUs the pinned sets were measured on, so the server splits the same list
+        "cpus": available_cpus,
+    }
+
+    with open(OUTPUT_PATH, "w") as f:
+        json.dump(config, f, indent=2)
+
+    print("\n" + "=" * 70)
+    print(f"Best: {best['workers']} workers x {best['intra_op_threads']} threads, "
+          f"pinning {'on' if best['cpu_pinning'] else 'off'}")
+    print(f"      /predict: {best['throughput']:.1f} img/s at p95 {best['p95_latency_ms']:.1f} ms (batch 1)")
+    print(f"      jobs: batch {job_best['batch_size']}, {job_best['throughput']:.1f} img/s")
+    print(f"Serving config saved to: {OUTPUT_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import tensorflow as tf
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import numpy as np
+import json
+import os
+
+
+class CascadeCalibrator:
+    """Pick fast-model escalation thresholds on the val split for a target accuracy loss"""
+
+    def __init__(self, full_model_path, fast_model_path, val_data_dir, max_accuracy_loss=0.01):
+        self.full_model_path = full_model_path
+        self.fast_model_path = fast_model_path
+        self.val_data_dir = val_data_dir
+        self.max_accuracy_loss = max_accuracy_loss
+
+    def load_split(self, img_size):
+        """Val images at one resolution, in a fixed order"""
+        return ImageDataGenerator(rescale=1./255).flow_from_directory(
+            directory=self.val_data_dir,
+            target_size=img_size,
+            batch_size=32,
+            class_mode='categorical',
+            shuffle=False
+        )
+
+    def full_model_probs(self):
+        print(f"Loading full model: {self.full_model_path}")
+        model = tf.keras.models.load_model(self.full_model_path)
+        generator = self.load_split(tuple(model.input_shape[1:3]))
+        return model.predict(generator, verbose=1), generator.classes
+
+    def fast_model_probs(self):
+        print(f"Loading fast model: {self.fast_model_path}")
+        interpreter = tf.lite.Interpreter(model_path=self.fast_model_path)
+        interpreter.allocate_tensors()
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        generator = self.load_split(tuple(int(d) for d in input_details["shape"][1:3]))
+
+        # Same (de)quantisation as backend/cascade.py, so the thresholds transfer
+        in_scale, in_zero = input_details["quantization"]
+        out_scale, out_zero = output_details["quantization"]
+        quantized_in = input_details["dtype"] in (np.uint8, np.int8) and in_scale
+        quantized_out = output_details["dtype"] in (np.uint8, np.int8) and out_scale
+
+        probs = []
+        for _ in range(len(generator)):
+            images, _ = next(generator)
+            for image in images:
+                data = np.expand_dims(image, axis=0)
+                if quantized_in:
+                    data = np.round(data / in_scale + in_zero)
+                interpreter.set_tensor(input_details["index"], data.astype(input_details["dtype"]))
+                interpreter.invoke()
+                output = interpreter.get_tensor(output_details["index"])[0].astype(np.float32)
+                if quantized_out:
+                    output = (output - out_zero) * out_scale
+                probs.append(output)
+
+        return np.array(probs), generator.classes
+
+    def calibrate(self):
+        """Grid-search confidence and margin thresholds, minimising escalations"""
+        full_probs, labels = self.full_model_probs()
+        fast_probs, fast_labels = self.fast_model_probs()
+        assert np.array_equal(labels, fast_labels), "Val split order differs between models"
+
+        full_pred = np.argmax(full_probs, axis=1)
+        fast_pred = np.argmax(fast_probs, axis=1)
+        top2 = np.sort(fast_probs, axis=1)[:, -2:]
+        confidence = top2[:, 1]
+        margin = top2[:, 1] - top2[:, 0]
+
+        full_accuracy = float(np.mean(full_pred == labels))
+        fast_accuracy = float(np.mean(fast_pred == labels))
+        target_accuracy = full_accuracy - self.max_accuracy_loss
+
+        print(f"\nFull model val accuracy: {full_accuracy:.4f}")
+        print(f"Fast model val accuracy: {fast_accuracy:.4f}")
+        print(f"Target cascade accuracy: {target_accuracy:.4f}")
+
+        best = None
+        # Thresholds above 1.0 escalate everything, so a valid choice always exists
+        for confidence_threshold in np.arange(0.0, 1.02, 0.01):
+            for margin_threshold in np.arange(0.0, 1.0, 0.05):
+                accepted = (confidence >= confidence_threshold) & (margin >= margin_threshold)
+                cascade_pred = np.where(accepted, fast_pred, full_pred)
+                accuracy = float(np.mean(cascade_pred == labels))
+                escalation_rate = float(1 - np.mean(accepted))
+
+                if accuracy < target_accuracy:
+                    continue
+                if best is None or escalation_rate < best["escalation_rate"]:
+                    best = {
+                        "confidence_threshold": round(float(confidence_threshold), 2),
+                        "margin_threshold": round(float(margin_threshold), 2),
+                        "val_cascade_accuracy": accuracy,
+                        "escalation_rate": escalation_rate,
+                    }
+
+        best.update({
+            "val_full_accuracy": full_accuracy,
+            "val_fast_accuracy": fast_accuracy,
+            "max_accuracy_loss": self.max_accuracy_loss,
+            "val_samples": int(len(labels)),
+        })
+
+        print("\n" + "=" * 50)
+        print("CASCADE CALIBRATION")
+        print("=" * 50)
+        print(f"Confidence threshold: {best['confidence_threshold']:.2f}")
+        print(f"Margin threshold: {best['margin_threshold']:.2f}")
+        print(f"Cascade val accuracy: {best['val_cascade_accuracy']:.4f}")
+        print(f"Escalation rate: {best['escalation_rate']*100:.1f}%")
+        return best
+
+
+def main():
+    FULL_MODEL_PATH = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango_disease_model.keras"
+    FAST_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "models", "mango_disease_model.tflite")
+    VAL_DATA_DIR = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango project\data\processed\val"
+    OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "cascade_config.json")
+    MAX_ACCURACY_LOSS = 0.01
+
+    for path in (FULL_MODEL_PATH, FAST_MODEL_PATH, VAL_DATA_DIR):
+        if not os.path.exists(path):
+            print(f"Error: '{path}' not found!")
+            return
+
+    calibrator = CascadeCalibrator(FULL_MODEL_PATH, FAST_MODEL_PATH, VAL_DATA_DIR, MAX_ACCURACY_LOSS)
+    config = calibrator.calibrate()
+
+    with open(OUTPUT_PATH, "w") as f:
+        json.dump(config, f, indent=2)
+    print(f"\nCascade config saved to: {OUTPUT_PATH}")
+    print("Set CASCADE_ENABLED = True in backend/app.py to use it.")
+
+if __name__ == "__main__":
+    main()
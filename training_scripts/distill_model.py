@@ -0,0 +1,396 @@
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import numpy as np
+import json
+import time
+import os
+
+
+tf.random.set_seed(42)
+np.random.seed(42)
+
+# Student architectures to try. Every student takes the same [0, 1] input as
+# the teacher, so the backend only has to change the resize size to serve it.
+STUDENT_CONFIGS = [
+    {"name": "mobilenetv3_small_224", "backbone": "mobilenetv3_small", "img_size": (224, 224), "alpha": 1.0},
+    {"name": "mobilenetv3_small_160", "backbone": "mobilenetv3_small", "img_size": (160, 160), "alpha": 1.0},
+    {"name": "mobilenetv2_160_a050", "backbone": "mobilenetv2", "img_size": (160, 160), "alpha": 0.5},
+    {"name": "mobilenetv2_128_a100", "backbone": "mobilenetv2", "img_size": (128, 128), "alpha": 1.0},
+]
+
+# Teacher soft targets, student training and every accuracy in the report go
+# through load_image, so each model is scored on the preprocessing it saw
+RESIZE_METHOD = "bilinear"
+
+
+def load_image(path, img_size):
+    """Decode one image file and resize it to img_size in [0, 1]"""
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    return tf.image.resize(image, img_size, method=RESIZE_METHOD) / 255.0
+
+
+class Distiller(keras.Model):
+    """Wraps a logits-producing student and trains it against cached teacher soft targets"""
+
+    def __init__(self, student, temperature=4.0, alpha=0.7):
+        super().__init__()
+        self.student = student
+        self.temperature = temperature
+        self.alpha = alpha
+        self.loss_tracker = keras.metrics.Mean(name="loss")
+        self.accuracy_tracker = keras.metrics.CategoricalAccuracy(name="accuracy")
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.accuracy_tracker]
+
+    def _distillation_loss(self, y_hard, y_soft, logits):
+        # y_soft is already softened with the same temperature
+        soft_loss = keras.losses.kl_divergence(
+            y_soft, tf.nn.softmax(logits / self.temperature)
+        ) * (self.temperature ** 2)
+        hard_loss = keras.losses.categorical_crossentropy(y_hard, logits, from_logits=True)
+        return tf.reduce_mean(self.alpha * soft_loss + (1 - self.alpha) * hard_loss)
+
+    def train_step(self, data):
+        x, (y_hard, y_soft) = data
+        with tf.GradientTape() as tape:
+            logits = self.student(x, training=True)
+            loss = self._distillation_loss(y_hard, y_soft, logits)
+        gradients = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(gradients, self.student.trainable_variables))
+
+        self.loss_tracker.update_state(loss)
+        self.accuracy_tracker.update_state(y_hard, logits)
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, data):
+        x, (y_hard, y_soft) = data
+        logits = self.student(x, training=False)
+        loss = self._distillation_loss(y_hard, y_soft, logits)
+
+        self.loss_tracker.update_state(loss)
+        self.accuracy_tracker.update_state(y_hard, logits)
+        return {m.name: m.result() for m in self.metrics}
+
+    def call(self, inputs, training=False):
+        return self.student(inputs, training=training)
+
+
+class MangoDistillationTrainer:
+    def __init__(self, teacher_path, data_dir, output_dir, batch_size=32,
+                 temperature=4.0, alpha=0.7):
+        self.teacher_path = teacher_path
+        self.data_dir = data_dir
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.temperature = temperature
+        self.alpha = alpha
+        self.teacher = None
+        self.teacher_img_size = (224, 224)
+        self.class_names = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def load_teacher(self):
+        """Load the production .keras model used as the teacher"""
+        print(f"Loading teacher from: {self.teacher_path}")
+        self.teacher = keras.models.load_model(self.teacher_path)
+        self.teacher_img_size = tuple(self.teacher.input_shape[1:3])
+        print(f"Teacher input shape: {self.teacher.input_shape}")
+        return self.teacher
+
+    def list_split(self, split):
+        """File paths and class labels of a split, in a fixed order"""
+        generator = ImageDataGenerator().flow_from_directory(
+            directory=os.path.join(self.data_dir, split),
+            batch_size=self.batch_size,
+            class_mode='categorical',
+            shuffle=False
+        )
+        self.class_names = list(generator.class_indices.keys())
+        return np.array(generator.filepaths), generator.classes
+
+    def image_dataset(self, filepaths, img_size):
+        """Batched images only, for teacher targets and evaluation"""
+        return (tf.data.Dataset.from_tensor_slices(filepaths)
+                .map(lambda path: load_image(path, img_size), num_parallel_calls=tf.data.AUTOTUNE)
+                .batch(self.batch_size)
+                .prefetch(tf.data.AUTOTUNE))
+
+    def teacher_fingerprint(self):
+        """Identifies the teacher file and preprocessing the cached probabilities came from.
+
+        The temperature is left out on purpose: soften() applies it to the
+        cached probabilities, so it can change without recomputing them.
+        """
+        stat = os.stat(self.teacher_path)
+        return {
+            "teacher_path": os.path.abspath(self.teacher_path),
+            "teacher_mtime": stat.st_mtime,
+            "teacher_size": stat.st_size,
+            "resize_method": RESIZE_METHOD,
+        }
+
+    def compute_soft_targets(self, split):
+        """Run the teacher once over a split and cache its probabilities to disk"""
+        cache_path = os.path.join(self.output_dir, f"teacher_soft_targets_{split}.npz")
+        filepaths, labels = self.list_split(split)
+        fingerprint = self.teacher_fingerprint()
+
+        if os.path.exists(cache_path):
+            cached = np.load(cache_path, allow_pickle=False)
+            cached_fingerprint = {key: cached[key].item() for key in fingerprint if key in cached.files}
+            if cached_fingerprint != fingerprint:
+                print("Cached soft targets came from a different teacher or preprocessing, recomputing...")
+            elif np.array_equal(cached["filepaths"], filepaths):
+                print(f"Using cached soft targets: {cache_path}")
+                return cached["filepaths"], cached["labels"], cached["probs"]
+            else:
+                print("Cached soft targets are stale, recomputing...")
+
+        if self.teacher is None:
+            self.load_teacher()
+
+        print(f"Computing teacher soft targets for '{split}' ({len(filepaths)} images)...")
+        probs = self.teacher.predict(self.image_dataset(filepaths, self.teacher_img_size), verbose=1)
+
+        np.savez_compressed(cache_path, filepaths=filepaths, labels=labels, probs=probs, **fingerprint)
+        print(f"Soft targets cached to: {cache_path}")
+        return filepaths, labels, probs
+
+    def soften(self, probs):
+        """Re-apply the distillation temperature to the teacher's softmax output"""
+        logits = np.log(np.clip(probs, 1e-8, 1.0)) / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        soft = np.exp(logits)
+        return (soft / soft.sum(axis=1, keepdims=True)).astype(np.float32)
+
+    def make_dataset(self, filepaths, labels, probs, img_size, training):
+        """Build a tf.data pipeline yielding (image, (hard, soft)) for the student"""
+        num_classes = len(self.class_names)
+        hard = tf.one_hot(labels, num_classes)
+        soft = self.soften(probs)
+
+        def load(path, y_hard, y_soft):
+            image = load_image(path, img_size)
+            if training:
+                # Only label-preserving augmentation: the soft targets were
+                # computed on the un-augmented image.
+                image = tf.image.random_flip_left_right(image)
+            return image, (y_hard, y_soft)
+
+        dataset = tf.data.Dataset.from_tensor_slices((filepaths, hard, soft))
+        if training:
+            dataset = dataset.shuffle(len(filepaths), seed=42)
+        return (dataset
+                .map(load, num_parallel_calls=tf.data.AUTOTUNE)
+                .batch(self.batch_size)
+                .prefetch(tf.data.AUTOTUNE))
+
+    def create_student(self, config):
+        """Create a logits-producing student network and return it with its backbone"""
+        img_size = config["img_size"]
+        num_classes = len(self.class_names)
+
+        if config["backbone"] == "mobilenetv3_small":
+            base_model = tf.keras.applications.MobileNetV3Small(
+                weights='imagenet',
+                include_top=False,
+                input_shape=(*img_size, 3),
+                alpha=config["alpha"],
+                include_preprocessing=False
+            )
+        else:
+            base_model = tf.keras.applications.MobileNetV2(
+                weights='imagenet',
+                include_top=False,
+                input_shape=(*img_size, 3),
+                alpha=config["alpha"]
+            )
+
+        base_model.trainable = False
+
+        inputs = keras.Input(shape=(*img_size, 3))
+        # Backbones expect [-1, 1]; the serving contract is [0, 1]
+        x = layers.Rescaling(2.0, offset=-1.0)(inputs)
+        x = base_model(x, training=False)
+        x = layers.GlobalAveragePooling2D()(x)
+        x = layers.Dropout(0.2)(x)
+        logits = layers.Dense(num_classes)(x)
+
+        return keras.Model(inputs, logits, name=config["name"]), base_model
+
+    def train_student(self, config, epochs=10, fine_tune_epochs=5):
+        """Distil the teacher into one student configuration"""
+        print("\n" + "=" * 50)
+        print(f"DISTILLING STUDENT: {config['name']}")
+        print("=" * 50)
+
+        train_data = self.compute_soft_targets('train')
+        val_data = self.compute_soft_targets('val')
+
+        train_ds = self.make_dataset(*train_data, config["img_size"], training=True)
+        val_ds = self.make_dataset(*val_data, config["img_size"], training=False)
+
+        student, base_model = self.create_student(config)
+        distiller = Distiller(student, self.temperature, self.alpha)
+
+        callbacks = [
+            keras.callbacks.EarlyStopping(
+                monitor='val_accuracy',
+                patience=5,
+                restore_best_weights=True
+            ),
+            keras.callbacks.ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=0.2,
+                patience=3,
+                min_lr=1e-7
+            )
+        ]
+
+        print("Phase 1: Head distillation")
+        distiller.compile(optimizer=keras.optimizers.Adam(learning_rate=0.001))
+        history1 = distiller.fit(
+            train_ds,
+            epochs=epochs,
+            validation_data=val_ds,
+            callbacks=callbacks,
+            verbose=1
+        )
+
+        print("\nPhase 2: Full distillation")
+        # The backbone was called with training=False, so BatchNorm stays in inference mode
+        base_model.trainable = True
+
+        distiller.compile(optimizer=keras.optimizers.Adam(learning_rate=0.0001))
+        distiller.fit(
+            train_ds,
+            initial_epoch=history1.epoch[-1] + 1,
+            epochs=history1.epoch[-1] + 1 + fine_tune_epochs,
+            validation_data=val_ds,
+            callbacks=callbacks,
+            verbose=1
+        )
+
+        # Export with a softmax so the student is a drop-in replacement for the teacher
+        outputs = layers.Softmax()(student.output)
+        serving_model = keras.Model(student.input, outputs, name=config["name"])
+        serving_model.compile(
+            optimizer=keras.optimizers.Adam(),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+
+        model_path = os.path.join(self.output_dir, f"{config['name']}.keras")
+        serving_model.save(model_path)
+        print(f"Student saved as: {model_path}")
+        return serving_model, model_path
+
+    def evaluate_accuracy(self, model, img_size):
+        """Top-1 accuracy on the test split at the model's own resolution"""
+        filepaths, labels = self.list_split('test')
+        predictions = model.predict(self.image_dataset(filepaths, img_size), verbose=0)
+        y_pred = np.argmax(predictions, axis=1)
+        return float(np.mean(y_pred == labels))
+
+    def measure_cpu_latency(self, model, img_size, runs=50, warmup=10):
+        """Median and p95 single-image CPU latency in milliseconds"""
+        image = np.random.rand(1, *img_size, 3).astype(np.float32)
+
+        with tf.device('/CPU:0'):
+            infer = tf.function(lambda x: model(x, training=False))
+            for _ in range(warmup):
+                infer(image)
+
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                infer(image).numpy()
+                timings.append((time.perf_counter() - start) * 1000)
+
+        return float(np.median(timings)), float(np.percentile(timings, 95))
+
+    def benchmark(self, name, model, img_size, model_path):
+        """Collect the accuracy / latency / size row for one model"""
+        accuracy = self.evaluate_accuracy(model, img_size)
+        latency_ms, latency_p95_ms = self.measure_cpu_latency(model, img_size)
+        return {
+            "name": name,
+            "img_size": list(img_size),
+            "params": int(model.count_params()),
+            "size_mb": os.path.getsize(model_path) / (1024 * 1024),
+            "accuracy": accuracy,
+            "latency_ms": latency_ms,
+            "latency_p95_ms": latency_p95_ms,
+        }
+
+    def run(self, configs=STUDENT_CONFIGS, epochs=10, fine_tune_epochs=5):
+        """Distil every student config and report accuracy versus CPU latency"""
+        if self.teacher is None:
+            self.load_teacher()
+
+        # Fills in class_names and the train cache before any student is built
+        self.compute_soft_targets('train')
+
+        print("\nBenchmarking teacher...")
+        results = [self.benchmark("teacher", self.teacher, self.teacher_img_size, self.teacher_path)]
+
+        for config in configs:
+            model, model_path = self.train_student(config, epochs, fine_tune_epochs)
+            results.append(self.benchmark(config["name"], model, config["img_size"], model_path))
+
+        teacher = results[0]
+        for row in results:
+            row["accuracy_delta"] = row["accuracy"] - teacher["accuracy"]
+            row["speedup"] = teacher["latency_ms"] / row["latency_ms"]
+
+        self.print_report(results)
+
+        report_path = os.path.join(self.output_dir, "distillation_report.json")
+        with open(report_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Report saved to: {report_path}")
+        return results
+
+    def print_report(self, results):
+        """Print the accuracy versus latency table"""
+        print("\n" + "=" * 90)
+        print("ACCURACY vs CPU LATENCY")
+        print("=" * 90)
+        print(f"{'Model':<24}{'Input':>10}{'Params':>11}{'MB':>8}{'Acc':>9}{'dAcc':>9}{'ms':>9}{'Speedup':>10}")
+        for row in results:
+            size = f"{row['img_size'][0]}x{row['img_size'][1]}"
+            print(f"{row['name']:<24}{size:>10}{row['params']:>11,}{row['size_mb']:>8.1f}"
+                  f"{row['accuracy']*100:>8.2f}%{row['accuracy_delta']*100:>+8.2f}%"
+                  f"{row['latency_ms']:>9.2f}{row['speedup']:>9.2f}x")
+
+
+def main():
+    TEACHER_PATH = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango_disease_model.keras"
+    DATA_DIR = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango project\data\processed"
+    OUTPUT_DIR = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\students"
+    BATCH_SIZE = 16
+    EPOCHS = 10
+    FINE_TUNE_EPOCHS = 5
+
+    if not os.path.exists(TEACHER_PATH):
+        print(f"Error: Teacher model '{TEACHER_PATH}' not found!")
+        print("Please run train_model.py first.")
+        return
+
+    if not os.path.exists(DATA_DIR):
+        print(f"Error: Data directory '{DATA_DIR}' not found!")
+        print("Please run split_data.py first to create the train/val/test split.")
+        return
+
+    trainer = MangoDistillationTrainer(TEACHER_PATH, DATA_DIR, OUTPUT_DIR, BATCH_SIZE)
+
+    print("Starting knowledge distillation...")
+    trainer.run(STUDENT_CONFIGS, EPOCHS, FINE_TUNE_EPOCHS)
+
+if __name__ == "__main__":
+    main()
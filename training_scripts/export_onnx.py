@@ -0,0 +1,204 @@
+import tensorflow as tf
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import numpy as np
+import subprocess
+import importlib.util
+import json
+import sys
+import os
+
+# Export-only dependencies, not needed by the training scripts or the TensorFlow server
+EXPORT_REQUIREMENTS = {"tf2onnx": "tf2onnx", "onnxruntime": "onnxruntime", "psutil": "psutil"}
+# The benchmark imports the server's own inference code from here
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+# Run in a fresh interpreter so each backend's memory is measured on its own,
+# without the other runtime (or this script's TensorFlow) already resident.
+# Both sides go through the same inference path and thread settings as backend/app.py.
+MEMORY_PROBE = r'''
+import json, os, sys, time
+import numpy as np
+import psutil
+
+process = psutil.Process()
+baseline = process.memory_info().rss
+backend, model_path, img_size, backend_dir = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4]
+sys.path.insert(0, backend_dir)
+from serving_config import load_serving_config
+
+start = time.perf_counter()
+if backend == "onnx":
+    from onnx_backend import OnnxModel
+    config = load_serving_config(os.path.join(backend_dir, "serving_config.json"), "onnx")
+    predict = OnnxModel(model_path, config["intra_op_threads"]).predict
+else:
+    import tensorflow as tf
+    config = load_serving_config(os.path.join(backend_dir, "serving_config.json"), "tensorflow")
+    tf.config.threading.set_intra_op_parallelism_threads(config["intra_op_threads"])
+    tf.config.threading.set_inter_op_parallelism_threads(config["inter_op_threads"])
+    model = tf.keras.models.load_model(model_path)
+
+    @tf.function
+    def infer(images):
+        return model(images, training=False)
+
+    concrete = infer.get_concrete_function(tf.TensorSpec([1, img_size, img_size, 3], tf.float32))
+    predict = lambda x: concrete(tf.constant(x)).numpy()
+
+image = np.random.rand(1, img_size, img_size, 3).astype(np.float32)
+predict(image)
+load_s = time.perf_counter() - start
+
+timings = []
+for _ in range(50):
+    t = time.perf_counter()
+    predict(image)
+    timings.append((time.perf_counter() - t) * 1000)
+
+print(json.dumps({
+    "import_and_load_s": load_s,
+    "rss_mb": process.memory_info().rss / (1024 * 1024),
+    "rss_growth_mb": (process.memory_info().rss - baseline) / (1024 * 1024),
+    "latency_ms": float(np.median(timings)),
+    "latency_p95_ms": float(np.percentile(timings, 95)),
+}))
+'''
+
+
+class OnnxExporter:
+    """Convert the trained .keras model to ONNX and check it against the original"""
+
+    def __init__(self, model_path, onnx_path, test_data_dir, opset=13):
+        self.model_path = model_path
+        self.onnx_path = onnx_path
+        self.test_data_dir = test_data_dir
+        self.opset = opset
+        self.model = None
+
+    def export(self):
+        """Write the ONNX model with a dynamic batch dimension"""
+        import tf2onnx
+
+        print(f"Loading model from: {self.model_path}")
+        self.model = tf.keras.models.load_model(self.model_path)
+
+        spec = (tf.TensorSpec((None, *self.model.input_shape[1:]), tf.float32, name="input"),)
+        print(f"Converting to ONNX (opset {self.opset})...")
+        tf2onnx.convert.from_keras(self.model, input_signature=spec, opset=self.opset, output_path=self.onnx_path)
+
+        print(f"ONNX model saved as: {self.onnx_path}")
+        print(f"File size: {os.path.getsize(self.onnx_path) / (1024*1024):.2f} MB")
+
+    def check_parity(self, tolerance=1e-4):
+        """Compare Keras and ONNX Runtime outputs over the whole test split"""
+        import onnxruntime as ort
+
+        print("\n" + "=" * 50)
+        print("NUMERICAL PARITY ON TEST SPLIT")
+        print("=" * 50)
+
+        test_generator = ImageDataGenerator(rescale=1./255).flow_from_directory(
+            directory=self.test_data_dir,
+            target_size=tuple(self.model.input_shape[1:3]),
+            batch_size=32,
+            class_mode='categorical',
+            shuffle=False
+        )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(self.onnx_path, options, providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+
+        keras_probs, onnx_probs = [], []
+        for _ in range(len(test_generator)):
+            images, _ = next(test_generator)
+            images = images.astype(np.float32)
+            keras_probs.append(self.model(images, training=False).numpy())
+            onnx_probs.append(session.run(None, {input_name: images})[0])
+
+        keras_probs = np.concatenate(keras_probs)
+        onnx_probs = np.concatenate(onnx_probs)
+        labels = test_generator.classes
+
+        max_abs_diff = float(np.max(np.abs(keras_probs - onnx_probs)))
+        top1_agreement = float(np.mean(np.argmax(keras_probs, axis=1) == np.argmax(onnx_probs, axis=1)))
+        keras_accuracy = float(np.mean(np.argmax(keras_probs, axis=1) == labels))
+        onnx_accuracy = float(np.mean(np.argmax(onnx_probs, axis=1) == labels))
+        passed = max_abs_diff <= tolerance and top1_agreement == 1.0
+
+        print(f"Images compared: {len(labels)}")
+        print(f"Max abs probability difference: {max_abs_diff:.2e} (tolerance {tolerance:.0e})")
+        print(f"Top-1 agreement: {top1_agreement*100:.2f}%")
+        print(f"Keras accuracy: {keras_accuracy:.4f}")
+        print(f"ONNX accuracy: {onnx_accuracy:.4f}")
+        print("PARITY OK" if passed else "PARITY FAILED - do not deploy this export")
+
+        return {
+            "images": int(len(labels)),
+            "max_abs_diff": max_abs_diff,
+            "top1_agreement": top1_agreement,
+            "keras_accuracy": keras_accuracy,
+            "onnx_accuracy": onnx_accuracy,
+            "passed": passed,
+        }
+
+    def compare_backends(self):
+        """Single-image latency and process memory for each backend as the server runs it"""
+        print("\n" + "=" * 50)
+        print("KERAS vs ONNX RUNTIME (batch size 1, CPU)")
+        print("=" * 50)
+
+        img_size = str(self.model.input_shape[1])
+        results = {}
+        for backend, path in (("keras", self.model_path), ("onnx", self.onnx_path)):
+            output = subprocess.run(
+                [sys.executable, "-c", MEMORY_PROBE, backend, path, img_size, BACKEND_DIR],
+                capture_output=True, text=True, check=True
+            ).stdout
+            results[backend] = json.loads(output.strip().splitlines()[-1])
+
+        print(f"{'':<24}{'Keras':>12}{'ONNX':>12}")
+        for key, label in (("import_and_load_s", "Import + load (s)"),
+                           ("rss_mb", "Process RSS (MB)"),
+                           ("latency_ms", "Median latency (ms)"),
+                           ("latency_p95_ms", "p95 latency (ms)")):
+            print(f"{label:<24}{results['keras'][key]:>12.2f}{results['onnx'][key]:>12.2f}")
+        print(f"Speedup: {results['keras']['latency_ms'] / results['onnx']['latency_ms']:.2f}x")
+        return results
+
+
+def main():
+    MODEL_PATH = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango_disease_model.keras"
+    ONNX_PATH = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango_disease_model.onnx"
+    TEST_DATA_DIR = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango project\data\processed\test"
+
+    if not os.path.exists(MODEL_PATH):
+        print(f"Error: Model '{MODEL_PATH}' not found!")
+        print("Please run train_model.py first.")
+        return
+
+    missing = [package for module, package in EXPORT_REQUIREMENTS.items()
+               if importlib.util.find_spec(module) is None]
+    if missing:
+        print(f"Error: missing packages for the ONNX export: {', '.join(missing)}")
+        print(f"Install them with: pip install {' '.join(missing)}")
+        return
+
+    exporter = OnnxExporter(MODEL_PATH, ONNX_PATH, TEST_DATA_DIR)
+    exporter.export()
+
+    report = {"parity": exporter.check_parity()}
+    report["comparison"] = exporter.compare_backends()
+
+    report_path = os.path.splitext(ONNX_PATH)[0] + "_export_report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nExport report saved to: {report_path}")
+
+    if report["parity"]["passed"]:
+        print('Set INFERENCE_BACKEND = "onnx" in backend/app.py to serve it.')
+
+if __name__ == "__main__":
+    main()
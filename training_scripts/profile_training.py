@@ -0,0 +1,313 @@
+import tensorflow as tf
+from tensorflow import keras
+import numpy as np
+import json
+import time
+import os
+
+from train_model import MangoDiseaseClassifier
+
+
+class TrainingProfiler:
+    """Break MangoDiseaseClassifier training steps down into where the time goes"""
+
+    def __init__(self, classifier, output_dir, num_steps=20, warmup_steps=3,
+                 trace_steps=(5, 10), fine_tune_at=100):
+        self.classifier = classifier
+        self.output_dir = output_dir
+        self.num_steps = num_steps
+        self.warmup_steps = warmup_steps
+        self.trace_steps = trace_steps
+        self.fine_tune_at = fine_tune_at
+        self.loss_fn = keras.losses.CategoricalCrossentropy()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def set_phase(self, phase):
+        """Reproduce the trainable state and optimizer of one train() phase"""
+        model = self.classifier.model
+        base_model = model.layers[1]
+
+        if phase == "feature_extraction":
+            base_model.trainable = False
+            learning_rate = 0.001
+        else:
+            base_model.trainable = True
+            for layer in base_model.layers[:self.fine_tune_at]:
+                layer.trainable = False
+            learning_rate = 0.0001/10
+
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+
+    def make_step_functions(self):
+        """Compiled forward, forward+backward and full step functions for timing by subtraction"""
+        model = self.classifier.model
+        optimizer = model.optimizer
+
+        @tf.function
+        def forward(x, y):
+            return self.loss_fn(y, model(x, training=True))
+
+        @tf.function
+        def forward_backward(x, y):
+            with tf.GradientTape() as tape:
+                loss = self.loss_fn(y, model(x, training=True))
+            gradients = tape.gradient(loss, model.trainable_variables)
+            return tf.linalg.global_norm(gradients)
+
+        @tf.function
+        def full_step(x, y):
+            with tf.GradientTape() as tape:
+                loss = self.loss_fn(y, model(x, training=True))
+            gradients = tape.gradient(loss, model.trainable_variables)
+            optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+            return loss
+
+        return forward, forward_backward, full_step
+
+    def measure_batch_load(self, train_gen, batches=5):
+        """Serial cost of producing one augmented batch, without any prefetching"""
+        timings = []
+        for index in range(min(batches, len(train_gen))):
+            start = time.perf_counter()
+            train_gen[index]
+            timings.append((time.perf_counter() - start) * 1000)
+        return float(np.median(timings))
+
+    def profile_steps(self, train_gen, phase):
+        """Time forward, backward and optimizer by subtraction, then data wait on its own"""
+        print(f"\nProfiling {phase} steps...")
+        self.set_phase(phase)
+        forward, forward_backward, full_step = self.make_step_functions()
+
+        def timed(fn, *args):
+            start = time.perf_counter()
+            fn(*args).numpy()
+            return (time.perf_counter() - start) * 1000
+
+        trace_dir = os.path.join(self.output_dir, "trace", phase)
+        timings = {"forward": [], "backward": [], "optimizer": []}
+
+        # Pass 1: compute only. Each batch runs three step functions, so batch
+        # loading is kept out of this loop entirely.
+        for step in range(self.warmup_steps + self.num_steps):
+            x, y = next(train_gen)
+            x = tf.convert_to_tensor(x, dtype=tf.float32)
+            y = tf.convert_to_tensor(y, dtype=tf.float32)
+
+            if step == self.warmup_steps + self.trace_steps[0]:
+                tf.profiler.experimental.start(trace_dir)
+
+            with tf.profiler.experimental.Trace(phase, step_num=step, _r=1):
+                forward_ms = timed(forward, x, y)
+                forward_backward_ms = timed(forward_backward, x, y)
+                step_ms = timed(full_step, x, y)
+
+            if step == self.warmup_steps + self.trace_steps[1] - 1:
+                tf.profiler.experimental.stop()
+                print(f"Trace saved to: {trace_dir}")
+
+            if step < self.warmup_steps:
+                continue
+
+            timings["forward"].append(forward_ms)
+            timings["backward"].append(max(forward_backward_ms - forward_ms, 0.0))
+            timings["optimizer"].append(max(step_ms - forward_backward_ms, 0.0))
+
+        breakdown = {key: float(np.median(values)) for key, values in timings.items()}
+        breakdown["batch_load"] = self.measure_batch_load(train_gen)
+        breakdown.update(self.measure_data_wait(train_gen, full_step))
+        breakdown["batch_size"] = int(x.shape[0])
+        breakdown["images_per_sec"] = breakdown["batch_size"] / (breakdown["step"] / 1000)
+        return breakdown
+
+    def measure_data_wait(self, train_gen, full_step, max_queue_size=10):
+        """Stall per step when batches come through a fit-style prefetching queue.
+
+        Only full_step runs per batch, so the prefetch thread gets the real step
+        time to produce the next one. The queue that filled up while starting is
+        drained first, so the measured steps see the steady state.
+        """
+        enqueuer = keras.utils.OrderedEnqueuer(train_gen, use_multiprocessing=False, shuffle=True)
+        enqueuer.start(workers=1, max_queue_size=max_queue_size)
+        batches = enqueuer.get()
+
+        for _ in range(max_queue_size):
+            next(batches)
+
+        data_waits, steps = [], []
+        for _ in range(self.num_steps):
+            start = time.perf_counter()
+            x, y = next(batches)
+            data_wait = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            full_step(tf.convert_to_tensor(x, dtype=tf.float32), tf.convert_to_tensor(y, dtype=tf.float32)).numpy()
+            data_waits.append(data_wait)
+            steps.append(data_wait + (time.perf_counter() - start) * 1000)
+
+        enqueuer.stop()
+        return {"data_wait": float(np.median(data_waits)), "step": float(np.median(steps))}
+
+    def profile_base_layers(self, batch):
+        """Per-layer forward (and, past fine_tune_at, backward) time for the MobileNetV2 base"""
+        print("\nProfiling MobileNetV2 base layers...")
+        base_model = self.classifier.model.layers[1]
+        rows = []
+
+        for index, layer in enumerate(base_model.layers):
+            if isinstance(layer, keras.layers.InputLayer):
+                continue
+
+            # Feed each layer its real input activations from the same batch
+            if layer.input is base_model.input:
+                inputs = batch
+            else:
+                inputs = keras.Model(base_model.input, layer.input)(batch, training=False)
+            trainable = index >= self.fine_tune_at
+
+            @tf.function
+            def layer_forward(inputs):
+                return layer(inputs, training=False)
+
+            @tf.function
+            def layer_forward_backward(inputs):
+                with tf.GradientTape() as tape:
+                    tape.watch(inputs)
+                    outputs = layer(inputs, training=False)
+                sources = [inputs, layer.trainable_weights]
+                gradients = tf.nest.flatten(tape.gradient(outputs, sources))
+                return tf.linalg.global_norm([g for g in gradients if g is not None])
+
+            forward_ms = self._time_callable(layer_forward, inputs)
+            backward_ms = 0.0
+            if trainable:
+                backward_ms = max(self._time_callable(layer_forward_backward, inputs) - forward_ms, 0.0)
+
+            rows.append({
+                "index": index,
+                "name": layer.name,
+                "type": layer.__class__.__name__,
+                "fine_tuned": trainable,
+                "forward_ms": forward_ms,
+                "backward_ms": backward_ms,
+            })
+
+        return rows
+
+    def _time_callable(self, fn, *args, runs=10):
+        tf.nest.map_structure(lambda t: t.numpy(), fn(*args))
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            tf.nest.map_structure(lambda t: t.numpy(), fn(*args))
+            timings.append((time.perf_counter() - start) * 1000)
+        return float(np.median(timings))
+
+    def summarize_layers(self, rows):
+        """Roll per-layer timings up into MobileNetV2 blocks"""
+        blocks = {}
+        for row in rows:
+            # e.g. block_13_expand -> block_13, Conv1 -> Conv1
+            parts = row["name"].split("_")
+            block = "_".join(parts[:2]) if parts[0] == "block" else parts[0]
+            entry = blocks.setdefault(block, {"forward_ms": 0.0, "backward_ms": 0.0, "first_index": row["index"]})
+            entry["forward_ms"] += row["forward_ms"]
+            entry["backward_ms"] += row["backward_ms"]
+
+        frozen_ms = sum(r["forward_ms"] for r in rows if not r["fine_tuned"])
+        fine_tuned_ms = sum(r["forward_ms"] + r["backward_ms"] for r in rows if r["fine_tuned"])
+        return {
+            "blocks": blocks,
+            "frozen_forward_ms": frozen_ms,
+            "fine_tuned_forward_backward_ms": fine_tuned_ms,
+        }
+
+    def run(self):
+        """Profile both training phases plus the base layers and write the report"""
+        train_gen, _, _ = self.classifier.create_data_generators()
+        if self.classifier.model is None:
+            self.classifier.create_model(len(self.classifier.class_names))
+
+        report = {
+            "config": {
+                "img_size": list(self.classifier.img_size),
+                "batch_size": self.classifier.batch_size,
+                "fine_tune_at": self.fine_tune_at,
+                "num_steps": self.num_steps,
+            },
+            "phases": {
+                phase: self.profile_steps(train_gen, phase)
+                for phase in ("feature_extraction", "fine_tune")
+            },
+        }
+
+        batch, _ = next(train_gen)
+        layer_rows = self.profile_base_layers(tf.convert_to_tensor(batch, dtype=tf.float32))
+        report["base_layers"] = self.summarize_layers(layer_rows)
+        report["slowest_layers"] = sorted(
+            layer_rows, key=lambda r: r["forward_ms"] + r["backward_ms"], reverse=True
+        )[:10]
+
+        self.print_report(report)
+
+        report_path = os.path.join(self.output_dir, "training_profile.json")
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Profile report saved to: {report_path}")
+        return report
+
+    def print_report(self, report):
+        """Print a compact summary of the profile"""
+        print("\n" + "=" * 60)
+        print("TRAINING STEP PROFILE")
+        print("=" * 60)
+        print(f"Batch size: {report['config']['batch_size']}, fine_tune_at: {report['config']['fine_tune_at']}")
+
+        for phase, breakdown in report["phases"].items():
+            step = breakdown["step"]
+            print(f"\n{phase} ({step:.1f} ms/step, {breakdown['images_per_sec']:.1f} img/s)")
+            for key in ("data_wait", "forward", "backward", "optimizer"):
+                print(f"  {key:<10} {breakdown[key]:>8.1f} ms  ({breakdown[key] / step * 100:5.1f}%)")
+
+            print(f"  (one batch costs {breakdown['batch_load']:.1f} ms to generate serially; "
+                  f"data_wait is what remains after fit-style prefetching)")
+
+            if breakdown["data_wait"] > 0.5 * step:
+                print("  -> Input pipeline bound: prefetching cannot keep up with the model")
+
+        layers_report = report["base_layers"]
+        print(f"\nMobileNetV2 base: frozen forward {layers_report['frozen_forward_ms']:.1f} ms, "
+              f"fine-tuned forward+backward {layers_report['fine_tuned_forward_backward_ms']:.1f} ms")
+
+        print("\nSlowest base layers:")
+        for row in report["slowest_layers"]:
+            marker = "*" if row["fine_tuned"] else " "
+            print(f"  {marker} {row['name']:<28}{row['forward_ms']:>8.2f} fwd{row['backward_ms']:>8.2f} bwd")
+        print("  (* = unfrozen in fine-tuning)")
+
+
+def main():
+    DATA_DIR = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\mango project\data\processed"
+    OUTPUT_DIR = r"C:\Users\johnr\Sideline Projects\Mango Disease\MachineLearning\profile"
+    IMG_SIZE = (224, 224)
+    BATCH_SIZE = 16
+    FINE_TUNE_AT = 100
+
+    if not os.path.exists(DATA_DIR):
+        print(f"Error: Data directory '{DATA_DIR}' not found!")
+        print("Please run split_data.py first to create the train/val/test split.")
+        return
+
+    classifier = MangoDiseaseClassifier(DATA_DIR, IMG_SIZE, BATCH_SIZE)
+    profiler = TrainingProfiler(classifier, OUTPUT_DIR, fine_tune_at=FINE_TUNE_AT)
+
+    print("Starting training profile...")
+    profiler.run()
+
+if __name__ == "__main__":
+    main()
@@ -100,8 +100,12 @@ class MangoDiseaseClassifier:
         self.model = model
         return model
     
-    def train(self, epochs=15, fine_tune_epochs=10):
-        """Train the model in two phases: feature extraction and fine-tuning"""
+    def train(self, epochs=15, fine_tune_epochs=10, fine_tune_at=100, profile_dir=None, profile_batch=(10, 20)):
+        """Train the model in two phases: feature extraction and fine-tuning.
+
+        Pass profile_dir to capture a TensorBoard profiler trace of the
+        profile_batch range of steps in each phase.
+        """
         
         train_gen, val_gen, test_gen = self.create_data_generators()
         num_classes = len(self.class_names)
@@ -126,6 +130,13 @@ class MangoDiseaseClassifier:
             )
         ]
         
+        if profile_dir:
+            callbacks.append(keras.callbacks.TensorBoard(
+                log_dir=profile_dir,
+                profile_batch=profile_batch
+            ))
+            print(f"Profiling steps {profile_batch} into: {profile_dir}")
+        
         print("\nStarting Phase 1 training...")
         history1 = self.model.fit(
             train_gen,
@@ -139,8 +150,6 @@ class MangoDiseaseClassifier:
         
         self.model.layers[1].trainable = True
         
-        fine_tune_at = 100
-        
         for layer in self.model.layers[1].layers[:fine_tune_at]:
             layer.trainable = False
         
@@ -213,6 +222,8 @@ def main():
     BATCH_SIZE = 16  
     EPOCHS = 15
     FINE_TUNE_EPOCHS = 10
+    FINE_TUNE_AT = 100
+    PROFILE_DIR = None  # e.g. r"...\MachineLearning\profile" to capture a profiler trace
     
     if not os.path.exists(DATA_DIR):
         print(f"Error: Data directory '{DATA_DIR}' not found!")
@@ -222,7 +233,7 @@ def main():
     classifier = MangoDiseaseClassifier(DATA_DIR, IMG_SIZE, BATCH_SIZE)
     
     print("Starting model training...")
-    history, test_gen = classifier.train(EPOCHS, FINE_TUNE_EPOCHS)
+    history, test_gen = classifier.train(EPOCHS, FINE_TUNE_EPOCHS, FINE_TUNE_AT, PROFILE_DIR)
     
     classifier.evaluate(test_gen)
     